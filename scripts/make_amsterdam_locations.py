@@ -16,24 +16,40 @@ Each LOCATIONS.js file contains entries formatted as
 
 from __future__ import annotations
 
+import hashlib
 import json
 import re
 import shutil
 import sys
+import time
 import unicodedata
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache, partial
 from html.parser import HTMLParser
 from pathlib import Path
 from typing import Dict, Iterable, List, Mapping, Optional
 from urllib.error import HTTPError
-from urllib.request import Request, urlopen
+from urllib.request import build_opener
 
 CBS_WIJKEN_URL = (
     "https://opendata.cbs.nl/ODataApi/odata/84583NED/"
-    "WijkenEnBuurten?$top=20000"
+    "WijkenEnBuurten?$select=Key,Title,Municipality"
+    # Only municipality (GM) and neighbourhood (BU) rows are used.
+    "&$filter=startswith(Key,'GM')%20or%20startswith(Key,'BU')"
+    "&$top=20000"
 )
 WIKIPEDIA_MUNICIPALITIES_URL = "https://nl.wikipedia.org/wiki/Lijst_van_Nederlandse_gemeenten"
+HTTP_TIMEOUT = 30
+
+# Downloads are cached on disk so re-runs within a day skip the network.
+CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "http"
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Shared opener so every download carries the same headers and handlers.
+_OPENER = build_opener()
+_OPENER.addheaders = [("User-Agent", "Mozilla/5.0")]
 
 # Convert Dutch province labels from the Wikipedia table to the names requested
 # for the folder layout.
@@ -81,22 +97,32 @@ MUNICIPALITY_OVERRIDES: Mapping[str, str] = {
     "Bergen (NH)": "North Holland",
 }
 
+# Invisible characters Wikipedia sprinkles through table cells.
+_CELL_TRANSLATE = str.maketrans({"\xa0": " ", "\xad": None, "\u200b": None})
+_RE_BRACKET = re.compile(r"\[[^\]]*\]")
+_RE_WS = re.compile(r"\s+")
+_RE_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_RE_DASHES = re.compile(r"-+")
+_CELL_TAGS = frozenset({"td", "th"})
+
 
 def _normalize_cell(text: str) -> str:
-    text = text.replace("\xa0", " ")
-    text = text.replace("\xad", "")
-    text = text.replace("\u200b", "")
-    text = re.sub(r"\[[^\]]*\]", "", text)
-    text = re.sub(r"\s+", " ", text)
+    text = text.translate(_CELL_TRANSLATE)
+    text = _RE_BRACKET.sub("", text)
+    text = _RE_WS.sub(" ", text)
     return text.strip()
 
 
 class WikiTableParser(HTMLParser):
-    """Minimal HTML table parser geared toward Wikipedia wikitables."""
+    """Minimal wikitable parser that keeps only the municipality table.
+
+    The target is the first wikitable whose first row has both a "Gemeente"
+    and a "Provin…" column; other tables are skipped without collecting rows.
+    """
 
     def __init__(self) -> None:
         super().__init__()
-        self.tables: List[List[List[str]]] = []
+        self.table: Optional[List[List[str]]] = None
         self._capturing = False
         self._table_depth = 0
         self._current_table: Optional[List[List[str]]] = None
@@ -105,36 +131,46 @@ class WikiTableParser(HTMLParser):
         self._cell_buffer: List[str] = []
 
     def handle_starttag(self, tag: str, attrs: List[tuple[str, str]]) -> None:
-        attrs_dict = dict(attrs)
         if tag == "table":
-            classes = set((attrs_dict.get("class") or "").split())
-            if not self._capturing and "wikitable" in classes:
+            if self._capturing:
+                self._table_depth += 1
+            elif self.table is None and "wikitable" in (dict(attrs).get("class") or "").split():
                 self._capturing = True
                 self._table_depth = 1
                 self._current_table = []
-            elif self._capturing:
-                self._table_depth += 1
-        elif tag == "tr" and self._capturing:
+        elif self._current_table is None:
+            return
+        elif tag == "tr":
             self._current_row = []
-        elif tag in {"td", "th"} and self._capturing and self._current_row is not None:
+        elif tag in _CELL_TAGS and self._current_row is not None:
             self._capturing_cell = True
             self._cell_buffer = []
         elif tag == "br" and self._capturing_cell:
             self._cell_buffer.append(" ")
 
     def handle_endtag(self, tag: str) -> None:
-        if tag == "table" and self._capturing:
+        if not self._capturing:
+            return
+        if tag == "table":
             self._table_depth -= 1
             if self._table_depth == 0:
                 if self._current_table:
-                    self.tables.append(self._current_table)
+                    self.table = self._current_table
                 self._capturing = False
                 self._current_table = None
-        elif tag == "tr" and self._capturing:
-            if self._current_table is not None and self._current_row:
-                self._current_table.append(self._current_row)
+        elif tag == "tr":
+            row = self._current_row
             self._current_row = None
-        elif tag in {"td", "th"} and self._capturing_cell:
+            if self._current_table is None or not row:
+                return
+            if not self._current_table and not (
+                any("Gemeente" in cell for cell in row) and any("Provin" in cell for cell in row)
+            ):
+                # Not the municipality table; skip the rest of it.
+                self._current_table = None
+                return
+            self._current_table.append(row)
+        elif tag in _CELL_TAGS and self._capturing_cell:
             text = _normalize_cell("".join(self._cell_buffer))
             if self._current_row is not None:
                 self._current_row.append(text)
@@ -155,110 +191,124 @@ class Municipality:
 
 
 def fetch_bytes(url: str) -> bytes:
-    req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urlopen(req) as resp:
-        return resp.read()
+    cache_file = CACHE_DIR / hashlib.blake2b(url.encode("utf-8"), digest_size=16).hexdigest()
+    try:
+        if time.time() - cache_file.stat().st_mtime < CACHE_TTL_SECONDS:
+            return cache_file.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    with _OPENER.open(url, timeout=HTTP_TIMEOUT) as resp:
+        data = resp.read()
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_file = cache_file.with_suffix(".tmp")
+    tmp_file.write_bytes(data)
+    tmp_file.replace(cache_file)
+    return data
 
 
 def fetch_json(url: str) -> dict:
-    data = fetch_bytes(url)
-    text = data.decode("utf-8-sig")
-    return json.loads(text)
+    # json.loads detects the encoding (and any UTF-8 BOM) from raw bytes.
+    return json.loads(fetch_bytes(url))
 
 
+@lru_cache(maxsize=None)
 def slugify(value: str) -> str:
     norm = unicodedata.normalize("NFKD", value)
     ascii_only = norm.encode("ascii", "ignore").decode("ascii")
     ascii_only = ascii_only.lower()
     ascii_only = ascii_only.replace("&", " and ")
-    ascii_only = re.sub(r"[^a-z0-9]+", "-", ascii_only)
-    ascii_only = re.sub(r"-+", "-", ascii_only)
+    ascii_only = _RE_NON_ALNUM.sub("-", ascii_only)
+    ascii_only = _RE_DASHES.sub("-", ascii_only)
     return ascii_only.strip("-") or "item"
 
 
-def load_municipality_provinces() -> Dict[str, str]:
+def fetch_municipality_html() -> str:
     try:
-        html = fetch_bytes(WIKIPEDIA_MUNICIPALITIES_URL).decode("utf-8")
+        return fetch_bytes(WIKIPEDIA_MUNICIPALITIES_URL).decode("utf-8")
     except HTTPError as err:
         raise SystemExit(f"Failed to download municipality list: {err}")
 
+
+def load_municipality_provinces(html: str) -> Dict[str, str]:
+    # Everything before the first wikitable is page chrome; skip tokenizing it.
+    first_table = html.rfind("<table", 0, html.find("wikitable"))
     parser = WikiTableParser()
-    parser.feed(html)
-
-    target_table: Optional[List[List[str]]] = None
-    header_row: Optional[List[str]] = None
-    for table in parser.tables:
-        for row in table:
-            if any("Gemeente" in cell for cell in row):
-                header_row = row
-                target_table = table
-                break
-        if target_table is not None:
-            break
-
-    if not target_table or not header_row:
+    parser.feed(html[max(first_table, 0):])
+
+    target_table = parser.table
+    if not target_table:
         raise SystemExit("Could not locate municipality table on Wikipedia page")
+    # Cells were already run through _normalize_cell by the parser.
+    header = target_table[0]
 
-    header = [_normalize_cell(cell) for cell in header_row]
     try:
         municipality_idx = next(idx for idx, cell in enumerate(header) if "Gemeente" in cell)
         province_idx = next(idx for idx, cell in enumerate(header) if "Provin" in cell)
     except StopIteration as err:
         raise SystemExit("Could not determine header columns in municipality table") from err
 
+    min_row_len = max(municipality_idx, province_idx) + 1
     mapping: Dict[str, str] = {}
-    for row in target_table:
-        if row is header_row:
-            continue
-        if any("Gemeente" in cell for cell in row):
-            continue
-        if len(row) <= max(municipality_idx, province_idx):
+    # The header is row 0; repeated header rows further down carry "Gemeente"
+    # in the municipality column, so only that one cell needs checking.
+    for row in target_table[1:]:
+        if len(row) < min_row_len:
             continue
         municipality = row[municipality_idx].strip()
         province = row[province_idx].strip()
-        if not municipality or not province:
+        if not municipality or not province or "Gemeente" in municipality:
             continue
         province = PROVINCE_NAME_REMAP.get(province, province)
         mapping[municipality] = province
 
-    mapping.update(MUNICIPALITY_OVERRIDES)
     return mapping
 
 
 
-def build_municipality_index(wijken_data: Iterable[dict]) -> Dict[str, Municipality]:
+def build_municipality_index(
+    wijken_data: Iterable[dict], municipality_to_province: Mapping[str, str]
+) -> Dict[str, Municipality]:
     muni_names: Dict[str, str] = {}
     neighbourhoods: Dict[str, set] = defaultdict(set)
 
     for item in wijken_data:
-        key = (item.get("Key") or "").strip()
-        title = (item.get("Title") or "").strip()
-        municipality_code = (item.get("Municipality") or "").strip()
-
-        if key.startswith("GM"):
-            muni_names[key] = title
-        elif key.startswith("BU") and municipality_code:
-            if title:
+        key = item.get("Key")
+        key = key.strip() if key else ""
+        # Only municipality (GM) and neighbourhood (BU) rows matter; district
+        # (WK) and country rows skip the remaining field lookups entirely.
+        prefix = key[:2]
+        if prefix == "GM":
+            title = item.get("Title")
+            muni_names[key] = title.strip() if title else ""
+        elif prefix == "BU":
+            municipality_code = item.get("Municipality")
+            title = item.get("Title")
+            if not municipality_code or not title:
+                continue
+            municipality_code = municipality_code.strip()
+            title = title.strip()
+            if municipality_code and title:
                 neighbourhoods[municipality_code].add(title)
 
-    municipality_to_province = load_municipality_provinces()
-
     result: Dict[str, Municipality] = {}
     unresolved: List[str] = []
 
+    def lookup(candidate: str) -> Optional[str]:
+        # Manual overrides take precedence over the scraped Wikipedia table.
+        return MUNICIPALITY_OVERRIDES.get(candidate) or municipality_to_province.get(candidate)
+
     for code, name in sorted(muni_names.items()):
-        province = municipality_to_province.get(name)
+        province = lookup(name)
         if not province:
             # Fallback: try removing brackets or alternate spellings.
-            fallback_variants = {
+            fallback_variants = (
                 name.replace(" ('s-Gravenhage)", ""),
                 name.replace("Gemeente ", ""),
                 name.replace("-", " "),
-            }
-            province = next(
-                (municipality_to_province.get(var) for var in fallback_variants if var in municipality_to_province),
-                None,
             )
+            province = next(filter(None, map(lookup, fallback_variants)), None)
         if not province:
             unresolved.append(name)
             continue
@@ -267,13 +317,14 @@ def build_municipality_index(wijken_data: Iterable[dict]) -> Dict[str, Municipal
             code=code,
             name=name,
             province=province,
-            neighbourhoods=sorted(neighbourhoods.get(code, set()), key=str.casefold),
+            neighbourhoods=sorted(neighbourhoods.get(code, ()), key=str.casefold),
         )
 
     if unresolved:
         unresolved_list = ", ".join(sorted(unresolved))
-        raise SystemExit(
-            "Missing province mapping for: " + unresolved_list
+        print(
+            f"warning: {len(unresolved)} unresolved municipalities skipped: {unresolved_list}",
+            file=sys.stderr,
         )
 
     return result
@@ -286,38 +337,41 @@ def write_locations(root: Path, municipality: Municipality) -> None:
     province_slug = slugify(municipality.province)
     municipality_slug = slugify(municipality.name)
     out_dir = root / province_slug / municipality_slug
-    out_dir.mkdir(parents=True, exist_ok=True)
+    # The province directory is created up-front by main().
+    out_dir.mkdir(exist_ok=True)
 
-    out_file = out_dir / "LOCATIONS.js"
-
-    with out_file.open("w", encoding="utf-8") as fh:
-        fh.write("LOCATIONS = [\n")
-        for idx, neighbourhood in enumerate(municipality.neighbourhoods):
-            location = f"{neighbourhood}, {municipality.name}, {municipality.province}, Netherlands"
-            comma = "," if idx + 1 < len(municipality.neighbourhoods) else ""
-            fh.write(f"  {json.dumps(location)}{comma}\n")
-        fh.write("]\n")
+    locations = [
+        f"{neighbourhood}, {municipality.name}, {municipality.province}, Netherlands"
+        for neighbourhood in municipality.neighbourhoods
+    ]
+    body = "LOCATIONS = " + json.dumps(locations, indent=2) + "\n"
+    (out_dir / "LOCATIONS.js").write_text(body, encoding="utf-8")
 
 
 def main() -> None:
-    print("Downloading nationwide neighbourhood list…", file=sys.stderr)
-    wijken_payload = fetch_json(CBS_WIJKEN_URL)
-    wijken_data = wijken_payload.get("value") or []
+    print("Downloading nationwide neighbourhood list and municipality table…", file=sys.stderr)
+    # The two downloads are independent, so overlap them.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        wijken_future = executor.submit(fetch_json, CBS_WIJKEN_URL)
+        html_future = executor.submit(fetch_municipality_html)
+        wijken_data = wijken_future.result().get("value") or []
+        html = html_future.result()
     if not wijken_data:
         raise SystemExit("CBS dataset returned no rows.")
 
-    municipalities = build_municipality_index(wijken_data)
+    municipalities = build_municipality_index(wijken_data, load_municipality_provinces(html))
 
     root = Path(__file__).resolve().parent.parent / "out" / "locations"
-    if root.exists():
-        shutil.rmtree(root)
+    shutil.rmtree(root, ignore_errors=True)
     root.mkdir(parents=True, exist_ok=True)
-
-    total_files = 0
-    for municipality in municipalities.values():
-        write_locations(root, municipality)
-        if municipality.neighbourhoods:
-            total_files += 1
+    for province_slug in {slugify(m.province) for m in municipalities.values() if m.neighbourhoods}:
+        (root / province_slug).mkdir()
+
+    # write_locations only touches its own municipality folder, so the writes
+    # can overlap.
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(partial(write_locations, root), municipalities.values()))
+    total_files = sum(1 for m in municipalities.values() if m.neighbourhoods)
 
     print(
         f"✓ Generated {total_files} municipality files across {len(set(m.province for m in municipalities.values()))} provinces.",